@@ -6,47 +6,73 @@ Output:
 '''
 
 import numpy as np
+import scipy.fft as sfft
+import matplotlib
+from plot_utils import figure_axes, save_figure  # Selects the Agg backend before pyplot is imported
 import matplotlib.pyplot as plt
-import pandas as pd
 import os
+from io_utils import load_all
+from functools import lru_cache
 
-def load_data(file_path):
+@lru_cache(maxsize=8)
+def _hann(n):
     """
-    Load data from a CSV file.
-
-    Parameters:
-    - file_path: Path to the CSV file
-
-    Returns:
-    - time: Time array
-    - signal: Signal array
+    Return a cached, read-only float32 Hanning window of length n.
     """
-    data = pd.read_csv(file_path)
-    time = data['Time'].values
-    signal = data['Signal'].values
-    return time, signal
+    window = np.hanning(n).astype(np.float32)
+    window.flags.writeable = False
+    return window
 
 def fourier_transform_analysis(signal, sampling_rate):
     """
     Perform Fourier Transform analysis on the input signal.
 
+    The signal is real-valued, so only the non-negative half of the spectrum is computed.
+    The windowed signal is zero-padded to the next fast FFT length, so the frequency bins
+    are spaced sampling_rate / padded_length apart rather than sampling_rate / len(signal).
+
     Parameters:
     - signal: Input time-domain signal
     - sampling_rate: Sampling rate of the signal
 
     Returns:
-    - freqs: Frequencies corresponding to the FT
+    - freqs: Non-negative frequencies corresponding to the FT
     - magnitude: Magnitude of the FT
     """
-    n = len(signal)
-    window = np.hanning(n)  # Apply a Hanning window to the signal
-    signal_windowed = signal * window
-    freqs = np.fft.fftfreq(n, d=1/sampling_rate)
-    ft = np.fft.fft(signal_windowed)
-    magnitude = np.abs(ft) / n
-    return freqs, magnitude
-
-def plot_frequency_spectrum(freqs, magnitude, output_path=None):
+    freqs, magnitudes = fourier_transform_batch([signal], sampling_rate)
+    return freqs, magnitudes[0]
+
+def fourier_transform_batch(signals, sampling_rate):
+    """
+    Perform Fourier Transform analysis on several signals with a single batched FFT.
+
+    Each signal is windowed with its own Hanning window and zero-padded to a common fast
+    FFT length, so all rows share the same frequency bins. The transform runs in single
+    precision (float32 in, complex64 out), which is ample for the oscilloscope data.
+
+    Parameters:
+    - signals: Sequence of non-empty input time-domain signals (lengths may differ)
+    - sampling_rate: Sampling rate of the signals
+
+    Returns:
+    - freqs: Non-negative frequencies corresponding to the FT
+    - magnitudes: Magnitude of the FT, one row per signal
+    """
+    lengths = np.array([len(signal) for signal in signals])
+    m = sfft.next_fast_len(int(lengths.max()), real=True)  # Avoid slow FFTs for lengths with large prime factors
+
+    # Stack the windowed signals row by row (C-order, so each transform runs over contiguous memory)
+    signals_padded = np.zeros((len(signals), m), dtype=np.float32)
+    for row, signal in zip(signals_padded, signals):
+        n = len(signal)
+        np.multiply(signal, _hann(n), out=row[:n])  # Apply a Hanning window to the signal
+
+    freqs = sfft.rfftfreq(m, d=1/sampling_rate)
+    ft = sfft.rfft(signals_padded, axis=1, workers=-1)  # Use all available cores
+    magnitudes = np.abs(ft) * (1.0 / lengths)[:, np.newaxis].astype(np.float32)
+    return freqs, magnitudes
+
+def plot_frequency_spectrum(freqs, magnitude, output_path=None, ax=None):
     """
     Plot the frequency spectrum of the signal and optionally save the plot as an image.
 
@@ -54,18 +80,19 @@ def plot_frequency_spectrum(freqs, magnitude, output_path=None):
     - freqs: Frequencies corresponding to the FT
     - magnitude: Magnitude of the FT
     - output_path: Path to save the plot image (if None, display the plot)
+    - ax: Axes to clear and reuse for the plot (if None, a new figure is created)
     """
-    plt.figure(figsize=(10, 6))
-    plt.plot(freqs, magnitude)
-    plt.title('Frequency Spectrum')
-    plt.xlabel('Frequency (Hz)')
-    plt.ylabel('Magnitude')
-    plt.grid(True)
-    plt.xlim(0, 5000)  # Adjust the x-axis limit to focus on the range of interest
+    fig, ax, owns_figure = figure_axes(ax)
+
+    ax.plot(freqs, magnitude)
+    ax.set_title('Frequency Spectrum')
+    ax.set_xlabel('Frequency (Hz)')
+    ax.set_ylabel('Magnitude')
+    ax.grid(True)
+    ax.set_xlim(0, 5000)  # Adjust the x-axis limit to focus on the range of interest
     
     if output_path:
-        plt.savefig(output_path)
-        plt.close()
+        save_figure(fig, output_path, owns_figure)
         print(f"Saved plot to {output_path}")
     else:
         plt.show()
@@ -105,27 +132,42 @@ def process_datasets(input_dir, output_dir, sampling_rate, save_plots):
     # List of dataset filenames
     dataset_filenames = [f"Dataset_{i}.CSV" for i in range(1, 5)]
 
-    for filename in dataset_filenames:
-        file_path = os.path.join(input_dir, filename)
-        output_path = os.path.join(output_dir, f"{os.path.splitext(filename)[0]}_spectrum.png") if save_plots else None
+    # Load every dataset first so the spectra can be computed in one batched FFT
+    loaded, failed = load_all([os.path.join(input_dir, filename) for filename in dataset_filenames])
 
-        try:
-            # Load data
-            time, signal = load_data(file_path)
+    # An empty dataset has no spectrum, so report it here rather than letting it into the batch
+    failed += [(file_path, ValueError("Dataset has no samples")) for file_path, _, signal in loaded if len(signal) == 0]
+    loaded = [(file_path, time, signal) for file_path, time, signal in loaded if len(signal) > 0]
+    for file_path, e in failed:
+        print(f"Error processing {file_path}: {e}")
 
-            # Perform Fourier Transform analysis
-            freqs, magnitude = fourier_transform_analysis(signal, sampling_rate)
+    if not loaded:
+        return
 
+    # Perform Fourier Transform analysis on all datasets at once
+    freqs, magnitudes = fourier_transform_batch([signal for _, _, signal in loaded], sampling_rate)
+
+    # When saving, draw every spectrum on one reused figure instead of building a new one per dataset
+    ax = plt.subplots(figsize=(10, 6))[1] if save_plots else None
+
+    for (file_path, _, _), magnitude in zip(loaded, magnitudes):
+        filename = os.path.basename(file_path)
+        output_path = os.path.join(output_dir, f"{os.path.splitext(filename)[0]}_spectrum.png") if save_plots else None
+
+        try:
             # Plot the frequency spectrum
-            plot_frequency_spectrum(freqs, magnitude, output_path)
+            plot_frequency_spectrum(freqs, magnitude, output_path, ax=ax)
 
             # Calculate the dominant frequency and its error
-            dominant_freq, error_freq = np.abs(calculate_dominant_frequency(freqs, magnitude))
+            dominant_freq, error_freq = calculate_dominant_frequency(freqs, magnitude)
             print(f"Dominant frequency for {filename}: {dominant_freq:.2f} Hz ± {error_freq:.2f} Hz")
 
         except Exception as e:
             print(f"Error processing {file_path}: {e}")
 
+    if ax is not None:
+        plt.close(ax.figure)
+
 # Example usage
 input_dir = '../../data/FinalData'
 output_dir = '../../data/FinalData/FFT_Plots'
@@ -134,5 +176,7 @@ sampling_rate = 250000 # Taken from oscilloscope info in the initial CSV files
 # Prompt the user whether to save the plots or display them
 save_plots_input = input("Do you want to save the plots to files? (yes/no): ").strip().lower()
 save_plots = save_plots_input == 'yes'
+if not save_plots:
+    plt.switch_backend(matplotlib.rcParamsOrig['backend'])  # Displaying the plots needs the configured GUI backend
 
 process_datasets(input_dir, output_dir, sampling_rate, save_plots)
\ No newline at end of file
@@ -6,62 +6,74 @@ Output:
 '''
 
 import numpy as np
-import pandas as pd
-import matplotlib.pyplot as plt
-from scipy.signal import butter, filtfilt
-import glob
+from plot_utils import figure_axes, process_axes, save_figure, warmup  # Selects the Agg backend; plots are only saved to files
+from scipy.signal import butter, sosfiltfilt
+from concurrent.futures import ProcessPoolExecutor
 import os
+from io_utils import analyze_by_length, list_csv_files, load_all
 import logging
 
-def load_data(file_path):
+def design_high_pass(cutoff, fs, order=5):
     """
-    Load data from a CSV file.
+    Design a Butterworth high-pass filter in second-order sections form.
 
     Parameters:
-    - file_path: Path to the CSV file
+    - cutoff: Cutoff frequency for the high-pass filter
+    - fs: Sampling frequency
+    - order: Order of the filter (default is 5)
 
     Returns:
-    - time: Time array
-    - signal: Signal array
+    - sos: Second-order sections of the filter
     """
-    data = pd.read_csv(file_path)
-    time = data['Time'].values
-    signal = data['Signal'].values
-    return time, signal
+    nyquist = 0.5 * fs
+    normal_cutoff = cutoff / nyquist
+    return butter(order, normal_cutoff, btype='high', analog=False, output='sos')
 
-def high_pass_filter(signal, cutoff, fs, order=5):
+def high_pass_filter(signal, sos):
     """
     Apply a high-pass filter to isolate the noise.
 
     Parameters:
-    - signal: Input signal array
-    - cutoff: Cutoff frequency for the high-pass filter
-    - fs: Sampling frequency
-    - order: Order of the filter (default is 5)
+    - signal: Input signal array (or 2D array of signals, each row filtered independently)
+    - sos: Second-order sections of the high-pass filter (see design_high_pass)
 
     Returns:
     - filtered_signal: Filtered signal array (noise)
     """
-    nyquist = 0.5 * fs
-    normal_cutoff = cutoff / nyquist
-    b, a = butter(order, normal_cutoff, btype='high', analog=False)
-    filtered_signal = filtfilt(b, a, signal)
+    filtered_signal = sosfiltfilt(sos, signal)
     return filtered_signal
 
-def calculate_snr(signal, noise):
+def calculate_power(signal, noise):
     """
-    Calculate the Signal-to-Noise Ratio (SNR).
+    Calculate the mean power of the signal and the noise.
+
+    The squares are summed in a single pass without allocating an x**2 temporary. 2D arrays are treated
+    as one signal per row.
 
     Parameters:
     - signal: Signal array
     - noise: Noise array
 
+    Returns:
+    - signal_power: Mean power of the signal
+    - noise_power: Mean power of the noise
+    """
+    signal_power = np.einsum('...i,...i->...', signal, signal) / signal.shape[-1]
+    noise_power = np.einsum('...i,...i->...', noise, noise) / noise.shape[-1]
+    return signal_power, noise_power
+
+def calculate_snr(signal_power, noise_power):
+    """
+    Calculate the Signal-to-Noise Ratio (SNR).
+
+    Parameters:
+    - signal_power: Mean power of the signal (see calculate_power)
+    - noise_power: Mean power of the noise
+
     Returns:
     - snr: Signal-to-Noise Ratio in dB
     - snr_error: Error in the SNR value in dB
     """
-    signal_power = np.mean(signal ** 2)
-    noise_power = np.mean(noise ** 2)
     snr = 10 * np.log10(signal_power / noise_power)
 
     # Assume a percentage error for signal and noise power
@@ -73,23 +85,21 @@ def calculate_snr(signal, noise):
     snr_error = (10 / np.log(10)) * np.sqrt((sigma_signal / signal_power) ** 2 + (sigma_noise / noise_power) ** 2)
     return snr, snr_error
 
-def calculate_average_power_ratio(signal, noise):
+def calculate_average_power_ratio(signal_power, noise_power):
     """
     Calculate the average power ratio between the noise and the signal.
 
     Parameters:
-    - signal: Signal array
-    - noise: Noise array
+    - signal_power: Mean power of the signal (see calculate_power)
+    - noise_power: Mean power of the noise
 
     Returns:
     - power_ratio: Average power ratio (noise power / signal power)
     """
-    signal_power = np.mean(signal ** 2)
-    noise_power = np.mean(noise ** 2)
     power_ratio = noise_power / signal_power
     return power_ratio
 
-def plot_signal_and_noise(time, signal, noise, output_path, title='Signal and Noise'):
+def plot_signal_and_noise(time, signal, noise, output_path, title='Signal and Noise', ax=None):
     """
     Plot the signal and noise.
 
@@ -99,19 +109,90 @@ def plot_signal_and_noise(time, signal, noise, output_path, title='Signal and No
     - noise: Noise array
     - output_path: Path to save the plot image
     - title: Title of the plot
+    - ax: Axes to clear and reuse for the plot (if None, a new figure is created)
     """
-    plt.figure(figsize=(10, 6))
-    plt.plot(time, signal, label='Signal')
-    plt.plot(time, noise, label='Noise', linestyle='--')
-    plt.title(title)
-    plt.xlabel('Time')
-    plt.ylabel('Amplitude')
-    plt.legend()
-    plt.grid(True)
-    plt.savefig(output_path)
-    plt.close()
+    fig, ax, owns_figure = figure_axes(ax)
+
+    ax.plot(time, signal, label='Signal')
+    ax.plot(time, noise, label='Noise', linestyle='--')
+    ax.set_title(title)
+    ax.set_xlabel('Time')
+    ax.set_ylabel('Amplitude')
+    ax.legend()
+    ax.grid(True)
+    save_figure(fig, output_path, owns_figure)
     print(f"Saved plot to {output_path}")
 
+def _analyze_batch(stacked_signals, sos):
+    """
+    Estimate the noise and calculate the SNR of a 2D array of equal-length signals, one signal per row.
+
+    Parameters:
+    - stacked_signals: 2D array of signals
+    - sos: Second-order sections of the high-pass filter used to estimate the noise
+
+    Returns:
+    - estimated_noise: 2D array of estimated noise, one row per signal
+    - snr: SNR of each signal in dB
+    - snr_error: Error in the SNR of each signal in dB
+    - power_ratio: Average power ratio of each signal
+    """
+    # Estimate noise using a high-pass filter
+    estimated_noise = high_pass_filter(stacked_signals, sos)
+
+    # Calculate the signal and noise powers once, for both the SNR and the power ratio
+    signal_power, noise_power = calculate_power(stacked_signals, estimated_noise)
+
+    # Calculate SNR and its error
+    snr, snr_error = calculate_snr(signal_power, noise_power)
+
+    # Calculate average power ratio
+    power_ratio = calculate_average_power_ratio(signal_power, noise_power)
+    return estimated_noise, snr, snr_error, power_ratio
+
+def analyze_signals(signals, sos):
+    """
+    Estimate the noise and calculate the SNR of several signals.
+
+    Signals of the same length are stacked into one 2D array, so the high-pass filter and the power sums
+    run once per group of equal-length signals instead of once per file (see analyze_by_length).
+
+    Parameters:
+    - signals: List of signal arrays
+    - sos: Second-order sections of the high-pass filter used to estimate the noise
+
+    Returns:
+    - noises: List of estimated noise arrays, one per signal (None for signals that failed)
+    - results: List of dictionaries with the SNR, its error and the average power ratio, one per signal
+      (None for signals that failed)
+    - failed: List of (index, error) tuples for the signals that could not be analyzed
+    """
+    outputs, failed = analyze_by_length(signals, lambda stacked_signals: _analyze_batch(stacked_signals, sos))
+
+    noises = [None] * len(signals)
+    results = [None] * len(signals)
+    for index, output in enumerate(outputs):
+        if output is not None:
+            noises[index], snr, snr_error, power_ratio = output
+            results[index] = {'snr': snr, 'snr_error': snr_error, 'power_ratio': power_ratio}
+
+    return noises, results, failed
+
+def plot_file(file_path, time, signal, noise, output_dir):
+    """
+    Save the signal and noise plot for a single CSV file.
+
+    Parameters:
+    - file_path: Path to the CSV file the signal was loaded from
+    - time: Time array
+    - signal: Signal array
+    - noise: Estimated noise array
+    - output_dir: Path to the output directory to save plot images
+    """
+    output_plot_path = os.path.join(output_dir, f"{os.path.splitext(os.path.basename(file_path))[0]}_plot.png")
+    plot_signal_and_noise(time, signal, noise, output_plot_path, title=f'Signal and Noise from {os.path.basename(file_path)}',
+                          ax=process_axes())
+
 def process_files(input_dir, output_dir, cutoff_frequency, sampling_frequency):
     """
     Process all CSV files in the input directory and print the analysis results to the terminal.
@@ -128,45 +209,53 @@ def process_files(input_dir, output_dir, cutoff_frequency, sampling_frequency):
     # Ensure the output directory exists
     os.makedirs(output_dir, exist_ok=True)
 
-    # Get a list of all CSV files in the input directory
-    csv_files = glob.glob(os.path.join(input_dir, '*.csv')) + glob.glob(os.path.join(input_dir, '*.CSV'))
+    # Get a sorted list of all CSV files in the input directory (case-insensitive)
+    csv_files = list_csv_files(input_dir)
 
     if not csv_files:
         logging.info(f"No CSV files found in {input_dir}")
         return
 
-    for file_path in csv_files:
-        try:
-            # Load data
-            time, signal = load_data(file_path)
-
-            # Estimate noise using a high-pass filter
-            estimated_noise = high_pass_filter(signal, cutoff_frequency, sampling_frequency)
-
-            # Calculate SNR and its error
-            snr, snr_error = calculate_snr(signal, estimated_noise)
+    # Load every file, then analyze all the signals together
+    loaded, failed = load_all(csv_files)
+    for file_path, e in failed:
+        logging.error(f"Error processing {file_path}: {e}")
 
-            # Calculate average power ratio
-            power_ratio = calculate_average_power_ratio(signal, estimated_noise)
+    if not loaded:
+        return
 
-            # Print results to the terminal
-            print(f"Results for {os.path.basename(file_path)}:")
-            print(f"  SNR (dB): {snr:.2f}")
-            print(f"  SNR Error (dB): {snr_error:.2f}")
-            print(f"  Average Power Ratio (Noise/Signal): {power_ratio:.10f}")
+    # Design the high-pass filter once; the same filter is applied to every file
+    sos = design_high_pass(cutoff_frequency, sampling_frequency)
 
-            # Plot signal and noise
-            output_plot_path = os.path.join(output_dir, f"{os.path.splitext(os.path.basename(file_path))[0]}_plot.png")
-            plot_signal_and_noise(time, signal, estimated_noise, output_plot_path, title=f'Signal and Noise from {os.path.basename(file_path)}')
+    noises, results, analysis_failed = analyze_signals([signal for _, _, signal in loaded], sos)
+    for index, e in analysis_failed:
+        logging.error(f"Error processing {loaded[index][0]}: {e}")
 
-            logging.info(f"Processed {file_path}")
+    analyzed = [(entry, noise, result) for entry, noise, result in zip(loaded, noises, results) if result is not None]
 
-        except Exception as e:
-            logging.error(f"Error processing {file_path}: {e}")
+    # Each plot is independent, so draw them in a pool of worker processes (one per core)
+    with ProcessPoolExecutor(initializer=warmup) as executor:
+        futures = [executor.submit(plot_file, file_path, time, signal, noise, output_dir)
+                   for (file_path, time, signal), noise, _ in analyzed]
 
-# Example usage
-input_dir = '../../data/FinalData'
-output_dir = '../../data/FinalData/SNR_Plots'
-cutoff_frequency = 50  # Cutoff frequency for the high-pass filter in Hz
-sampling_frequency = 1000  # Sampling frequency in Hz
-process_files(input_dir, output_dir, cutoff_frequency, sampling_frequency)
\ No newline at end of file
+        for ((file_path, _, _), _, result), future in zip(analyzed, futures):
+            # Print results to the terminal (before waiting on the plot, so a plot error does not hide them)
+            print(f"Results for {os.path.basename(file_path)}:")
+            print(f"  SNR (dB): {result['snr']:.2f}")
+            print(f"  SNR Error (dB): {result['snr_error']:.2f}")
+            print(f"  Average Power Ratio (Noise/Signal): {result['power_ratio']:.10f}")
+
+            try:
+                future.result()
+                logging.info(f"Processed {file_path}")
+
+            except Exception as e:
+                logging.error(f"Error processing {file_path}: {e}")
+
+if __name__ == '__main__':
+    # Example usage
+    input_dir = '../../data/FinalData'
+    output_dir = '../../data/FinalData/SNR_Plots'
+    cutoff_frequency = 50  # Cutoff frequency for the high-pass filter in Hz
+    sampling_frequency = 1000  # Sampling frequency in Hz
+    process_files(input_dir, output_dir, cutoff_frequency, sampling_frequency)
\ No newline at end of file
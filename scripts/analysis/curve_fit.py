@@ -1,9 +1,10 @@
 import numpy as np
-import pandas as pd
+from plot_utils import figure_axes, save_figure  # Selects the Agg backend before pyplot is imported
 import matplotlib.pyplot as plt
 from scipy.optimize import curve_fit
 import os
 import glob
+from io_utils import load_time_signal
 
 def sine(x, amp, freq, phase):
     """
@@ -15,11 +16,72 @@ def sine(x, amp, freq, phase):
     - freq: Frequency of the sine wave
     - phase: Phase shift of the sine wave
 
+    Returns:
+    - Sine wave output
+    """
+    return sine_two_pi(2 * np.pi * x, amp, freq, phase)
+
+def sine_two_pi(two_pi_x, amp, freq, phase, out=None):
+    """
+    Sine function evaluated on a precomputed 2*pi*x array, so repeated evaluations during the fit
+    only do one multiply, add and sin per call. Every step is written into the same output array.
+
+    Parameters:
+    - two_pi_x: Input array already multiplied by 2*pi
+    - amp: Amplitude of the sine wave
+    - freq: Frequency of the sine wave
+    - phase: Phase shift of the sine wave
+    - out: Optional preallocated array to write the output into
+
     Returns:
     - Sine wave output
     """
     offset = 0  # Fixed offset
-    return amp * np.sin(2 * np.pi * freq * x + phase) + offset
+    out = np.multiply(two_pi_x, freq, out=out)
+    out += phase
+    np.sin(out, out=out)
+    out *= amp
+    out += offset
+    return out
+
+def sine_two_pi_jacobian(two_pi_x, amp, freq, phase, out=None):
+    """
+    Analytic Jacobian of sine_two_pi with respect to (amp, freq, phase).
+
+    Parameters:
+    - two_pi_x: Input array already multiplied by 2*pi
+    - amp: Amplitude of the sine wave
+    - freq: Frequency of the sine wave
+    - phase: Phase shift of the sine wave
+    - out: Optional preallocated (len(two_pi_x), 3) array to write the Jacobian into
+
+    Returns:
+    - jacobian: Array of partial derivatives, one column per parameter
+    """
+    if out is None:
+        out = np.empty((len(two_pi_x), 3), order='F')  # Fortran order keeps each column contiguous
+
+    angle = two_pi_x * freq + phase
+    np.sin(angle, out=out[:, 0])  # d/d(amp)
+    np.cos(angle, out=angle)
+    np.multiply(angle, amp, out=out[:, 2])  # d/d(phase)
+    np.multiply(out[:, 2], two_pi_x, out=out[:, 1])  # d/d(freq)
+    return out
+
+def estimate_frequency(time, signal):
+    """
+    Estimate the dominant frequency of the signal from the peak of its spectrum.
+
+    Parameters:
+    - time: Time array (uniformly sampled)
+    - signal: Signal array
+
+    Returns:
+    - frequency: Frequency of the largest non-DC spectral peak
+    """
+    spectrum = np.abs(np.fft.rfft(signal - signal.mean()))
+    freqs = np.fft.rfftfreq(len(signal), d=time[1] - time[0])
+    return freqs[np.argmax(spectrum)]
 
 def fit_sine(time, signal):
     """
@@ -32,25 +94,32 @@ def fit_sine(time, signal):
     Returns:
     - popt: Optimal values for the parameters
     - perr: Standard deviation errors of the parameters
-    - chi_squared: Chi-squared value of the fit
+    - chi_squared: Chi-squared value of the fit (samples with a zero signal are excluded)
     """
     # Initial guess for the parameters
     guess_amplitude = 6  # np.std(signal) * 2**0.5
-    guess_frequency = 400
+    guess_frequency = estimate_frequency(time, signal)  # Seeding from the spectrum needs fewer iterations than a fixed guess
     guess_phase = np.pi / 4
     p0 = [guess_amplitude, guess_frequency, guess_phase]
 
     # Fit the sine wave
-    popt, pcov = curve_fit(sine, time, signal, p0=p0)
+    two_pi_time = 2 * np.pi * time
+    model = np.empty_like(two_pi_time)  # Reused for every model evaluation of the fit (curve_fit copies the result)
+    jacobian = np.empty((len(time), 3), order='F')  # Reused for every Jacobian evaluation of the fit
+    popt, pcov = curve_fit(lambda x, *params: sine_two_pi(x, *params, out=model), two_pi_time, signal, p0=p0,
+                           jac=lambda x, *params: sine_two_pi_jacobian(x, *params, out=jacobian),
+                           method='lm', xtol=1e-8)
     perr = np.sqrt(np.diag(pcov))  # Calculate the standard deviation errors
 
-    # Calculate the chi-squared value
-    residuals = signal - sine(time, *popt)
-    chi_squared = np.sum((residuals ** 2) / signal)
+    # Calculate the chi-squared value, skipping samples where the signal is zero to avoid dividing by zero
+    residuals = sine_two_pi(two_pi_time, *popt)
+    residuals -= signal  # The sign does not matter once squared
+    inverse_signal = np.reciprocal(signal, out=np.zeros_like(signal), where=signal != 0)
+    chi_squared = float(np.einsum('i,i,i->', residuals, residuals, inverse_signal))
 
     return popt, perr, chi_squared
 
-def plot_fit(time, signal, popt, output_path):
+def plot_fit(time, signal, popt, output_path, ax=None):
     """
     Plot the original signal and the fitted sine wave.
 
@@ -59,17 +128,18 @@ def plot_fit(time, signal, popt, output_path):
     - signal: Signal array
     - popt: Optimal values for the parameters
     - output_path: Path to save the plot image
+    - ax: Axes to clear and reuse for the plot (if None, a new figure is created)
     """
-    plt.figure(figsize=(10, 6))
-    plt.plot(time, signal, label='Original Signal')
-    plt.plot(time, sine(time, *popt), label='Fitted Sine Wave', linestyle='--')
-    plt.title('Sine Wave Fitting')
-    plt.xlabel('Time')
-    plt.ylabel('Signal')
-    plt.legend()
-    plt.grid(True)
-    plt.savefig(output_path)
-    plt.close()
+    fig, ax, owns_figure = figure_axes(ax)
+
+    ax.plot(time, signal, label='Original Signal')
+    ax.plot(time, sine(time, *popt), label='Fitted Sine Wave', linestyle='--')
+    ax.set_title('Sine Wave Fitting')
+    ax.set_xlabel('Time')
+    ax.set_ylabel('Signal')
+    ax.legend()
+    ax.grid(True)
+    save_figure(fig, output_path, owns_figure)
     print(f"Saved plot to {output_path}")
 
 def process_files(input_dir, output_dir):
@@ -86,11 +156,12 @@ def process_files(input_dir, output_dir):
     # Get a list of all CSV files in the input directory
     csv_files = glob.glob(os.path.join(input_dir, 'Dataset_*.CSV'))
 
+    # Draw every fit on one reused figure instead of building a new one per file
+    fig, ax = plt.subplots(figsize=(10, 6))
+
     for file_path in csv_files:
         # Load data
-        data = pd.read_csv(file_path)
-        time = data['Time'].values
-        signal = data['Signal'].values
+        time, signal = load_time_signal(file_path)
 
         # Fit a sine wave to the data
         popt, perr, chi_squared = fit_sine(time, signal)
@@ -100,7 +171,7 @@ def process_files(input_dir, output_dir):
         output_path = os.path.join(output_dir, f"{os.path.splitext(file_name)[0]}_fit.png")
 
         # Plot the original data and the fitted sine wave
-        plot_fit(time, signal, popt, output_path)
+        plot_fit(time, signal, popt, output_path, ax=ax)
 
         # Print the optimal parameters, their errors, and the chi-squared value
         print(f"Optimal parameters for {file_name}:")
@@ -110,6 +181,8 @@ def process_files(input_dir, output_dir):
         print(f"  Offset = -0.5 (fixed)")
         print(f"  Chi-squared = {chi_squared}")
 
+    plt.close(fig)
+
 # Example usage
 input_dir = '../../data/FinalData'
 output_dir = '../../data/FinalData/CF_Plots'
@@ -0,0 +1,191 @@
+'''
+Goal: Shared data loading for the analysis scripts
+
+Output:
+- Time and signal arrays from the Dataset CSV files, cached as Parquet after the first read
+- Case-insensitive listings of the CSV files in a directory
+- Batched analysis of the loaded signals, one stacked 2D array per signal length
+'''
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.csv as pacsv
+import pyarrow.parquet as pq
+import os
+import tempfile
+
+def _write_parquet_cache(table, parquet_path):
+    """
+    Write a table to its Parquet cache file, leaving the cache out if the directory cannot be written.
+
+    The table is written to a temporary file in the same directory and moved into place, so an interrupted
+    or concurrent first load can never leave a truncated cache file behind. The cache file gets the usual
+    permissions for a new file under the current umask.
+
+    Parameters:
+    - table: Table parsed from the CSV file
+    - parquet_path: Path to the Parquet file next to the CSV file
+    """
+    try:
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(parquet_path) or '.', suffix='.parquet.tmp')
+    except OSError:
+        return  # Read-only or shared data directory: keep working from the CSV file
+
+    try:
+        with os.fdopen(fd, 'wb') as tmp_file:
+            pq.write_table(table, tmp_file)
+
+        # mkstemp creates the file readable by its owner only; give the cache the permissions of a
+        # normally created file so other users of a shared data directory can read it
+        umask = os.umask(0)
+        os.umask(umask)
+        os.chmod(tmp_path, 0o666 & ~umask)
+        os.replace(tmp_path, parquet_path)
+    except BaseException as e:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        if not isinstance(e, OSError):
+            raise
+
+def _source_metadata(file_stat):
+    """
+    Describe the version of a CSV file that a Parquet copy was made from.
+
+    Parameters:
+    - file_stat: os.stat result of the CSV file
+
+    Returns:
+    - metadata: Schema metadata with the modification time (in ns) and size of the CSV file
+    """
+    return {b'source_mtime_ns': str(file_stat.st_mtime_ns).encode(), b'source_size': str(file_stat.st_size).encode()}
+
+def _read_table(file_path):
+    """
+    Read the time and signal columns of a CSV file, from its Parquet copy if that was made from this CSV file.
+
+    The Parquet copy is only used if the modification time and size it recorded match the CSV file exactly,
+    so a CSV file replaced by one with an older timestamp (cp -p, rsync -a, tar -x) is still parsed again.
+    On a cache miss, or if the Parquet copy cannot be read, the CSV file is parsed and the parsed table is
+    returned directly; writing the Parquet copy for the next load is best-effort.
+
+    Parameters:
+    - file_path: Path to the CSV file
+
+    Returns:
+    - table: Table with the Time and Signal columns
+    """
+    parquet_path = os.path.splitext(file_path)[0] + '.parquet'
+    metadata = _source_metadata(os.stat(file_path))
+    try:
+        cached_metadata = pq.read_schema(parquet_path).metadata or {}
+        if all(cached_metadata.get(key) == value for key, value in metadata.items()):
+            return pq.read_table(parquet_path, columns=['Time', 'Signal'])
+    except Exception:
+        pass  # Missing, unreadable or corrupt cache: parse the CSV file and rewrite the cache
+
+    # pyarrow's multithreaded parser only converts the two columns needed, straight to float64
+    table = pacsv.read_csv(file_path, convert_options=pacsv.ConvertOptions(
+        include_columns=['Time', 'Signal'],
+        column_types={'Time': pa.float64(), 'Signal': pa.float64()}))
+    _write_parquet_cache(table.replace_schema_metadata(metadata), parquet_path)
+    return table
+
+def list_csv_files(input_dir):
+    """
+    List the CSV files in a directory (case-insensitive, single directory scan).
+
+    Parameters:
+    - input_dir: Path to the directory
+
+    Returns:
+    - csv_files: Sorted list of paths to the CSV files
+    """
+    return sorted(entry.path for entry in os.scandir(input_dir)
+                  if entry.is_file() and entry.name.lower().endswith('.csv'))
+
+def load_time_signal(file_path):
+    """
+    Load the time and signal columns from a CSV file.
+
+    The CSV file is only parsed on first use; later loads read the cached Parquet copy when it could be written.
+    The returned arrays are read-only views of the Arrow buffers.
+
+    Parameters:
+    - file_path: Path to the CSV file
+
+    Returns:
+    - time: Time array
+    - signal: Signal array
+    """
+    table = _read_table(file_path)
+    time = table.column('Time').to_numpy()
+    signal = table.column('Signal').to_numpy()
+    return time, signal
+
+def load_all(file_paths):
+    """
+    Load the time and signal columns from several CSV files.
+
+    Files that cannot be loaded are skipped and returned separately so the caller can report them.
+
+    Parameters:
+    - file_paths: Paths to the CSV files
+
+    Returns:
+    - loaded: List of (file_path, time, signal) tuples for the files that were loaded
+    - failed: List of (file_path, error) tuples for the files that could not be loaded
+    """
+    loaded = []
+    failed = []
+    for file_path in file_paths:
+        try:
+            time, signal = load_time_signal(file_path)
+            loaded.append((file_path, time, signal))
+        except Exception as e:
+            failed.append((file_path, e))
+    return loaded, failed
+
+def analyze_by_length(signals, analyze):
+    """
+    Run a batched analysis over several signals, stacking the signals of each length into one 2D array.
+
+    The analysis runs once per group of equal-length signals instead of once per file. If a group fails,
+    its signals are retried one at a time so only the signals that fail on their own are reported.
+
+    Parameters:
+    - signals: List of signal arrays
+    - analyze: Function that takes a 2D array with one signal per row and returns a tuple of arrays,
+      each with one entry (or row) per signal
+
+    Returns:
+    - results: List with one tuple of outputs per signal (None for signals that failed)
+    - failed: List of (index, error) tuples for the signals that could not be analyzed
+    """
+    results = [None] * len(signals)
+    failed = []
+
+    # Group the signals by length so each group can be stacked
+    groups = {}
+    for index, signal in enumerate(signals):
+        groups.setdefault(len(signal), []).append(index)
+
+    for indices in groups.values():
+        try:
+            batches = [(indices, analyze(np.stack([signals[index] for index in indices])))]
+        except Exception:
+            # Retry the group one signal at a time so a bad signal does not take the others with it
+            batches = []
+            for index in indices:
+                try:
+                    batches.append(([index], analyze(signals[index][np.newaxis])))
+                except Exception as e:
+                    failed.append((index, e))
+
+        # Scatter the rows of each batch back to the positions of their signals
+        for batch_indices, outputs in batches:
+            for row, index in enumerate(batch_indices):
+                results[index] = tuple(output[row] for output in outputs)
+
+    return results, failed
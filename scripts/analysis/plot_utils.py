@@ -0,0 +1,66 @@
+'''
+Goal: Shared plotting setup for the analysis scripts
+
+Output:
+- The Agg backend, selected on import (scripts that display plots switch back to the configured backend),
+  one reused figure per process and a worker initializer that warms it up
+- The figure setup and teardown shared by the plotting functions that can draw on a reused axes
+'''
+
+import matplotlib
+matplotlib.use('Agg')  # Plots are saved to files by default, and a GUI backend is not safe in worker processes
+import matplotlib.pyplot as plt
+from functools import lru_cache
+
+@lru_cache(maxsize=None)
+def process_axes():
+    """
+    Create (once per process) the figure and axes reused for every plot drawn by that process.
+
+    Returns:
+    - ax: Axes of the reused figure
+    """
+    fig, ax = plt.subplots(figsize=(10, 6))
+    return ax
+
+def figure_axes(ax=None):
+    """
+    Get the figure and axes to draw a plot on: the given axes, cleared for reuse, or a new figure.
+
+    Parameters:
+    - ax: Axes to clear and reuse for the plot (if None, a new figure is created)
+
+    Returns:
+    - fig: Figure to draw on
+    - ax: Axes to draw on
+    - owns_figure: True if the figure was created here and should be closed once saved (see save_figure)
+    """
+    if ax is None:
+        fig, ax = plt.subplots(figsize=(10, 6))
+        return fig, ax, True
+    ax.clear()
+    return ax.figure, ax, False
+
+def save_figure(fig, output_path, owns_figure, **savefig_kwargs):
+    """
+    Save a figure to a file, closing it if it was created for this plot.
+
+    Parameters:
+    - fig: Figure to save
+    - output_path: Path to save the plot image
+    - owns_figure: Whether the figure was created for this plot (see figure_axes)
+    - savefig_kwargs: Extra keyword arguments for fig.savefig
+    """
+    fig.savefig(output_path, **savefig_kwargs)
+    if owns_figure:
+        plt.close(fig)
+
+def warmup():
+    """
+    Initialize a worker process by rendering a throwaway plot on its reused figure, so the font cache and
+    the Agg renderer are loaded before the first real plot.
+    """
+    ax = process_axes()
+    ax.plot([0, 1], [0, 1])
+    ax.figure.canvas.draw()
+    ax.clear()
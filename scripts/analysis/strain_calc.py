@@ -1,7 +1,8 @@
 import numpy as np
-import pandas as pd
-import matplotlib.pyplot as plt
+from plot_utils import figure_axes, process_axes, save_figure, warmup  # Selects the Agg backend; plots are only saved to files
 import os
+from concurrent.futures import ProcessPoolExecutor
+from io_utils import analyze_by_length, load_all
 
 # Constants
 wavelength = 632.8e-9  # Wavelength of the laser in meters
@@ -9,50 +10,69 @@ I0 = 1  # Maximum intensity (assuming normalized intensity)
 arm_length = 1.43  # Length of the interferometer arm in meters
 error_intensity = 0.025  # 0.5% error on intensity measurements
 error_length = 0.025  # 0.5% error on length measurements
+displacement_per_radian = wavelength / (4 * np.pi)  # Mirror displacement per radian of interference phase
 
-def normalize_intensity(intensity):
+def normalize_intensity(intensity, out=None):
     """
     Normalize the signal intensity to a range between 0 and 1.
 
+    2D arrays are treated as one signal per row, each normalized by its own minimum and maximum.
+
     Parameters:
-    - intensity: Signal intensity array
+    - intensity: Signal intensity array (or 2D array of signals)
+    - out: Optional preallocated array to write the normalized intensity into (may be intensity itself)
 
     Returns:
-    - normalized_intensity: Normalized intensity array
+    - normalized_intensity: Normalized intensity array (all zeros for a constant signal)
     """
-    min_intensity = np.min(intensity)
-    max_intensity = np.max(intensity)
-    normalized_intensity = (intensity - min_intensity) / (max_intensity - min_intensity)
+    min_intensity = np.min(intensity, axis=-1, keepdims=True)
+    max_intensity = np.max(intensity, axis=-1, keepdims=True)
+
+    # One scalar division per signal, then a multiply per element; a constant signal is scaled by 0
+    intensity_range = max_intensity - min_intensity
+    inv_range = np.divide(1.0, intensity_range, out=np.zeros_like(intensity_range, dtype=np.float64), where=intensity_range != 0)
+
+    # Shift and scale in a single output array instead of allocating one array per operation (always floating
+    # point, so integer intensities are normalized too)
+    normalized_intensity = np.subtract(intensity, min_intensity, out=out, dtype=np.float64)
+    normalized_intensity *= inv_range
     return normalized_intensity
 
-def calculate_displacement(intensity):
+def calculate_displacement(intensity, out=None):
     """
     Calculate the displacement of the moving mirror as a function of the signal intensity.
 
     Parameters:
     - intensity: Signal intensity array
+    - out: Optional preallocated array to write the displacement into (may be intensity itself)
 
     Returns:
     - displacement: Displacement array in meters
     """
-    displacement = (wavelength / (4 * np.pi)) * np.arccos((intensity - I0) / I0)
+    # Each step is written into the same floating-point array; clamping keeps arccos inside its [-1, 1] domain
+    displacement = np.subtract(intensity, I0, out=out, dtype=np.float64)
+    displacement *= 1.0 / I0
+    np.clip(displacement, -1.0, 1.0, out=displacement)
+    np.arccos(displacement, out=displacement)
+    displacement *= displacement_per_radian
     return displacement
 
-def calculate_strain(displacement, arm_length):
+def calculate_strain(displacement, arm_length, out=None):
     """
     Calculate the strain as a function of the displacement.
 
     Parameters:
     - displacement: Displacement array in meters
     - arm_length: Length of the interferometer arm in meters
+    - out: Optional preallocated array to write the strain into (may be displacement itself)
 
     Returns:
     - strain: Strain array
     """
-    strain = displacement / arm_length
+    strain = np.multiply(displacement, 1.0 / arm_length, out=out)
     return strain
 
-def error_propagation(intensity, displacement, arm_length):
+def error_propagation(intensity, displacement, arm_length, out=None):
     """
     Perform error propagation to calculate the error in strain.
 
@@ -60,68 +80,113 @@ def error_propagation(intensity, displacement, arm_length):
     - intensity: Signal intensity array
     - displacement: Displacement array in meters
     - arm_length: Length of the interferometer arm in meters
+    - out: Optional preallocated array to write the error into (may be intensity itself)
 
     Returns:
-    - error_strain: Error in strain array
+    - error_strain: Error in strain array (NaN where the error is unbounded, i.e. |intensity - I0| = I0)
     """
-    error_displacement = (wavelength / (4 * np.pi)) * (1 / np.sqrt(1 - ((intensity - I0) / I0)**2)) * error_intensity
-    error_strain = np.sqrt((error_displacement / arm_length)**2 + (displacement * error_length / arm_length**2)**2)
+    # Intensity part, error_displacement / arm_length, computed in one array; 1 / sqrt(1 - u**2) is unbounded
+    # at |u| = 1, which is reported as NaN so the plots leave a gap there (floating point even for integer intensities)
+    error_strain = np.subtract(intensity, I0, out=out, dtype=np.float64)
+    error_strain *= 1.0 / I0
+    np.square(error_strain, out=error_strain)
+    np.subtract(1.0, error_strain, out=error_strain)
+    np.sqrt(error_strain, out=error_strain)
+    np.copyto(error_strain, np.nan, where=error_strain == 0)
+    np.divide(displacement_per_radian * error_intensity / arm_length, error_strain, out=error_strain)
+
+    # Combine with the length part, displacement * error_length / arm_length**2, as hypot(a, c*b) = c*hypot(a/c, b)
+    # so no array is allocated for it
+    length_factor = error_length / arm_length**2
+    error_strain *= 1.0 / length_factor
+    np.hypot(error_strain, displacement, out=error_strain)
+    error_strain *= length_factor
     return error_strain
 
-def load_data(file_path):
+def strain_pipeline(intensity, arm_length):
     """
-    Load data from a CSV file.
+    Calculate the strain and its error directly from the raw signal intensity.
+
+    Runs normalize_intensity -> calculate_displacement -> calculate_strain -> error_propagation, with every
+    step written into one of the two output arrays instead of a new intermediate array.
+    2D arrays are treated as one signal per row, each normalized by its own minimum and maximum.
 
     Parameters:
-    - file_path: Path to the CSV file
+    - intensity: Raw signal intensity array (or 2D array of signals)
+    - arm_length: Length of the interferometer arm in meters
 
     Returns:
-    - time: Time array
-    - intensity: Intensity array
+    - strain: Strain array
+    - error_strain: Error in strain array (NaN where the error is unbounded)
     """
-    data = pd.read_csv(file_path)
-    time = data['Time'].values
-    intensity = data['Signal'].values
-    return time, intensity
+    normalized_intensity = normalize_intensity(intensity)
 
-def plot_strain(time, strain, error_strain, output_path=None):
+    # The displacement gets the second array; the error then overwrites the normalized intensity,
+    # and the strain overwrites the displacement
+    displacement = calculate_displacement(normalized_intensity)
+    error_strain = error_propagation(normalized_intensity, displacement, arm_length, out=normalized_intensity)
+    strain = calculate_strain(displacement, arm_length, out=displacement)
+    return strain, error_strain
+
+def plot_strain(time, strain, error_strain, output_path, ax=None):
     """
-    Plot the strain with error lines.
+    Plot the strain with an error band.
 
     Parameters:
     - time: Time array
     - strain: Strain array
-    - error_strain: Error in strain array
-    - output_path: Path to save the plot image (if None, display the plot)
+    - error_strain: Error in strain array (NaN values leave a gap in the error band)
+    - output_path: Path to save the plot image
+    - ax: Axes to clear and reuse for the plot (if None, a new figure is created)
     """
-    # Remove points with infinite values in the error
-    finite_mask = np.isfinite(error_strain)
-    time_finite = time[finite_mask]
-    strain_finite = strain[finite_mask]
-    error_strain_finite = error_strain[finite_mask]
+    fig, ax, owns_figure = figure_axes(ax)
 
-    plt.figure(figsize=(10, 6))
-    plt.plot(time_finite, strain_finite, label='Strain')
+    ax.plot(time, strain, label='Strain', rasterized=True)
     
-    # Calculate the positive and negative error curves
-    strain_plus = strain_finite + error_strain_finite
-    strain_minus = strain_finite - error_strain_finite
-
-    plt.plot(time_finite, strain_plus, label='Positive Error', linestyle='--', color='grey', linewidth = 0.5)
-    plt.plot(time_finite, strain_minus, label='Negative Error', linestyle='--', color='grey', linewidth = 0.5)
-
-    plt.title('Strain of the Interferometer Arm with Error Lines')
-    plt.xlabel('Time')
-    plt.ylabel('Strain')
-    plt.grid(True)
-    plt.legend()
+    # Calculate the positive and negative error curves (NaN wherever the error is NaN)
+    strain_plus = strain + error_strain
+    strain_minus = strain - error_strain
+
+    # A single filled band is one polygon instead of two dashed lines of N segments each
+    ax.fill_between(time, strain_minus, strain_plus, label='Error', color='grey', alpha=0.3, linewidth=0)
+
+    ax.set_title('Strain of the Interferometer Arm with Error Band')
+    ax.set_xlabel('Time')
+    ax.set_ylabel('Strain')
+    ax.grid(True)
+    ax.legend()
     
-    if output_path:
-        plt.savefig(output_path)
-        plt.close()
-        print(f"Saved plot to {output_path}")
-    else:
-        plt.show()
+    save_figure(fig, output_path, owns_figure, dpi=100)
+    print(f"Saved plot to {output_path}")
+
+def analyze_datasets(intensities, arm_length):
+    """
+    Calculate the strain and its error for several datasets.
+
+    Datasets of the same length are stacked into one 2D array, so the strain pipeline runs once per group
+    of equal-length datasets instead of once per file (see analyze_by_length).
+
+    Parameters:
+    - intensities: List of raw signal intensity arrays
+    - arm_length: Length of the interferometer arm in meters
+
+    Returns:
+    - results: List of (strain, error_strain) tuples, one per dataset (None for datasets that failed)
+    - failed: List of (index, error) tuples for the datasets that could not be analyzed
+    """
+    return analyze_by_length(intensities, lambda stacked_intensities: strain_pipeline(stacked_intensities, arm_length))
+
+def plot_dataset(time, strain, error_strain, output_path):
+    """
+    Save the strain plot of a single dataset on the figure reused by the current process.
+
+    Parameters:
+    - time: Time array
+    - strain: Strain array
+    - error_strain: Error in strain array
+    - output_path: Path to save the plot image
+    """
+    plot_strain(time, strain, error_strain, output_path, ax=process_axes())
 
 def process_datasets(input_dir, output_dir):
     """
@@ -137,33 +202,42 @@ def process_datasets(input_dir, output_dir):
     # List of dataset filenames
     dataset_filenames = [f"Dataset_{i}.CSV" for i in range(1, 5)]
 
-    for filename in dataset_filenames:
-        file_path = os.path.join(input_dir, filename)
-        output_path = os.path.join(output_dir, f"{os.path.splitext(filename)[0]}_strain.png")
-
-        # Load data
-        time, intensity = load_data(file_path)
-
-        # Normalize the intensity
-        normalized_intensity = normalize_intensity(intensity)
-
-        # Calculate the displacement
-        displacement = calculate_displacement(normalized_intensity)
-
-        # Calculate the strain
-        strain = calculate_strain(displacement, arm_length)
-
-        # Perform error propagation
-        error_strain = error_propagation(normalized_intensity, displacement, arm_length)
-
-        # Plot the strain with error lines
-        plot_strain(time, strain, error_strain, output_path)
-
-        # Print the first few strain values and their errors
-        print(f"Strain values for {filename}: {strain[:5]}")
-        print(f"Error in strain for {filename}: {error_strain[:5]}")
-
-# Example usage
-input_dir = '../../data/FinalData'
-output_dir = '../../data/FinalData/Strain_Plots'
-process_datasets(input_dir, output_dir)
\ No newline at end of file
+    # Load every dataset first so the strain can be calculated for all of them together
+    loaded, failed = load_all([os.path.join(input_dir, filename) for filename in dataset_filenames])
+    for file_path, e in failed:
+        print(f"Error processing {file_path}: {e}")
+
+    if not loaded:
+        return
+
+    # Normalize the intensity and calculate the displacement, strain and error in strain in one pipeline
+    results, analysis_failed = analyze_datasets([intensity for _, _, intensity in loaded], arm_length)
+    for index, e in analysis_failed:
+        print(f"Error processing {loaded[index][0]}: {e}")
+
+    analyzed = [(file_path, time, result) for (file_path, time, _), result in zip(loaded, results) if result is not None]
+
+    # Each plot is independent, so draw them in a pool of worker processes (one per core)
+    with ProcessPoolExecutor(max_workers=os.cpu_count(), initializer=warmup) as executor:
+        futures = []
+        for file_path, time, (strain, error_strain) in analyzed:
+            filename = os.path.basename(file_path)
+            output_path = os.path.join(output_dir, f"{os.path.splitext(filename)[0]}_strain.png")
+            futures.append(executor.submit(plot_dataset, time, strain, error_strain, output_path))
+
+        for (file_path, _, (strain, error_strain)), future in zip(analyzed, futures):
+            filename = os.path.basename(file_path)
+            try:
+                future.result()
+            except Exception as e:
+                print(f"Error plotting {file_path}: {e}")
+
+            # Print the first few strain values and their errors
+            print(f"Strain values for {filename}: {strain[:5]}")
+            print(f"Error in strain for {filename}: {error_strain[:5]}")
+
+if __name__ == '__main__':
+    # Example usage
+    input_dir = '../../data/FinalData'
+    output_dir = '../../data/FinalData/Strain_Plots'
+    process_datasets(input_dir, output_dir)
\ No newline at end of file
@@ -1,45 +1,49 @@
-import matplotlib.pyplot as plt
+from analysis.plot_utils import process_axes, warmup  # Also selects the Agg backend
 import pandas as pd
-import glob
 import os
+from concurrent.futures import ProcessPoolExecutor
+from analysis.io_utils import list_csv_files
 
 def plot_csv(file_path, output_dir):
     """
     Plot the data from a CSV file and save the plot as an image.
 
+    The plot is drawn on the figure reused by the current process rather than on a new figure.
+
     Parameters:
     - file_path: Path to the CSV file
     - output_dir: Directory to save the plot images
     """
     try:
-        # Read the CSV file
-        data = pd.read_csv(file_path)
+        # Read only the time and signal columns, with their dtypes given up front
+        data = pd.read_csv(file_path, usecols=['Time', 'Signal'], dtype={'Time': 'float64', 'Signal': 'float64'},
+                           engine='c', memory_map=True)
 
         # Extract time and signal columns
         time = data['Time']
         signal = data['Signal']
 
         # Plot the data
-        plt.figure(figsize=(10, 6))
-        plt.plot(time, signal, label='Signal')
-        plt.title(f'Signal from {os.path.basename(file_path)}')
-        plt.xlabel('Time')
-        plt.ylabel('Signal')
-        plt.legend()
-        plt.grid(True)
+        ax = process_axes()
+        ax.clear()
+        ax.plot(time, signal, label='Signal')
+        ax.set_title(f'Signal from {os.path.basename(file_path)}')
+        ax.set_xlabel('Time')
+        ax.set_ylabel('Signal')
+        ax.legend()
+        ax.grid(True)
 
         # Save the plot as an image
         file_name, _ = os.path.splitext(os.path.basename(file_path))
         output_path = os.path.join(output_dir, f"{file_name}.png")
-        plt.savefig(output_path)
-        plt.close()
+        ax.figure.savefig(output_path)
         print(f"Saved plot to {output_path}")
     except Exception as e:
         print(f"Error processing {file_path}: {e}")
 
 def process_directory(input_dir, output_dir):
     """
-    Process all CSV files in the input directory and save plots to the output directory.
+    Process all CSV files in the input directory in parallel and save plots to the output directory.
 
     Parameters:
     - input_dir: Path to the input directory containing CSV files
@@ -48,17 +52,19 @@ def process_directory(input_dir, output_dir):
     # Ensure the output directory exists
     os.makedirs(output_dir, exist_ok=True)
 
-    # Get a list of all CSV files in the input directory (case-insensitive)
-    csv_files = glob.glob(os.path.join(input_dir, '*.csv')) + glob.glob(os.path.join(input_dir, '*.CSV'))
+    # Get a sorted list of all CSV files in the input directory (case-insensitive)
+    csv_files = list_csv_files(input_dir)
 
     if not csv_files:
         print(f"No CSV files found in {input_dir}")
         return
 
-    for file_path in csv_files:
-        plot_csv(file_path, output_dir)
+    # Each file is independent, so plot them in a pool of worker processes (one per core)
+    with ProcessPoolExecutor(max_workers=os.cpu_count(), initializer=warmup) as executor:
+        list(executor.map(plot_csv, csv_files, [output_dir] * len(csv_files)))
 
-# Example usage
-input_dir = '../data/CleanData'
-output_dir = '../data/Plots'
-process_directory(input_dir, output_dir)
\ No newline at end of file
+if __name__ == '__main__':
+    # Example usage
+    input_dir = '../data/CleanData'
+    output_dir = '../data/Plots'
+    process_directory(input_dir, output_dir)
\ No newline at end of file
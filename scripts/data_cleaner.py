@@ -1,6 +1,8 @@
-import pandas as pd
-import glob
+import pyarrow as pa
+import pyarrow.csv as pacsv
 import os
+from concurrent.futures import ProcessPoolExecutor
+from analysis.io_utils import list_csv_files
 
 def clean_and_load_csv(file_path, output_path):
     """
@@ -15,27 +17,52 @@ def clean_and_load_csv(file_path, output_path):
     - signal: Signal array
     """
     try:
-        # Read the CSV file
-        data = pd.read_csv(file_path, header=None, skiprows=3, usecols=[3, 4], names=['Time', 'Signal'])
+        # Read the CSV file, skipping the header rows and only converting the time and signal columns
+        data = pacsv.read_csv(
+            file_path,
+            read_options=pacsv.ReadOptions(skip_rows=3, column_names=['Info', 'Value', 'Blank', 'Time', 'Signal', 'Trailing']),
+            convert_options=pacsv.ConvertOptions(
+                include_columns=['Time', 'Signal'],
+                column_types={'Time': pa.float64(), 'Signal': pa.float64()}))
 
-        # Drop rows with NaN values
-        data.dropna(inplace=True)
+        # Drop rows with missing values
+        data = data.drop_null()
 
         # Save the cleaned data to a new CSV file
-        data.to_csv(output_path, index=False)
+        pacsv.write_csv(data, output_path, write_options=pacsv.WriteOptions(quoting_header='none'))
 
         # Extract time and signal arrays
-        time = data['Time'].values
-        signal = data['Signal'].values
+        time = data.column('Time').to_numpy()
+        signal = data.column('Signal').to_numpy()
 
         return time, signal
     except Exception as e:
         print(f"Error processing {file_path}: {e}")
         return None, None
 
+def clean_file(file_path, output_dir):
+    """
+    Clean a single CSV file into the output directory.
+
+    Parameters:
+    - file_path: Path to the dirty CSV file
+    - output_dir: Path to the output directory to save the cleaned CSV file
+
+    Returns:
+    - output_path: Path of the cleaned CSV file
+    - success: Boolean indicating whether the file was cleaned
+    """
+    # Generate the output file path
+    file_name = os.path.basename(file_path)
+    output_path = os.path.join(output_dir, file_name)
+
+    # Clean and load the CSV file
+    time, signal = clean_and_load_csv(file_path, output_path)
+    return output_path, time is not None and signal is not None
+
 def process_directory(input_dir, output_dir):
     """
-    Process all CSV files in the input directory and save cleaned files to the output directory.
+    Process all CSV files in the input directory in parallel and save cleaned files to the output directory.
 
     Parameters:
     - input_dir: Path to the input directory containing dirty CSV files
@@ -44,26 +71,25 @@ def process_directory(input_dir, output_dir):
     # Ensure the output directory exists
     os.makedirs(output_dir, exist_ok=True)
 
-    # Get a list of all CSV files in the input directory (case-insensitive)
-    csv_files = glob.glob(os.path.join(input_dir, '*.csv')) + glob.glob(os.path.join(input_dir, '*.CSV'))
+    # Get a sorted list of all CSV files in the input directory (case-insensitive)
+    csv_files = list_csv_files(input_dir)
 
     if not csv_files:
         print(f"No CSV files found in {input_dir}")
         return
 
-    for file_path in csv_files:
-        # Generate the output file path
-        file_name = os.path.basename(file_path)
-        output_path = os.path.join(output_dir, file_name)
-
-        # Clean and load the CSV file
-        time, signal = clean_and_load_csv(file_path, output_path)
-        if time is not None and signal is not None:
-            print(f"Processed {file_path} -> {output_path}")
-        else:
-            print(f"Failed to process {file_path}")
-
-# Example usage
-input_dir = '../data/DirtyData'
-output_dir = '../data/CleanData'
-process_directory(input_dir, output_dir)
\ No newline at end of file
+    # Each file is independent, so clean them in a pool of worker processes (one per core)
+    with ProcessPoolExecutor(max_workers=os.cpu_count()) as executor:
+        results = executor.map(clean_file, csv_files, [output_dir] * len(csv_files))
+
+        for file_path, (output_path, success) in zip(csv_files, results):
+            if success:
+                print(f"Processed {file_path} -> {output_path}")
+            else:
+                print(f"Failed to process {file_path}")
+
+if __name__ == '__main__':
+    # Example usage
+    input_dir = '../data/DirtyData'
+    output_dir = '../data/CleanData'
+    process_directory(input_dir, output_dir)
\ No newline at end of file
@@ -1,8 +1,10 @@
+import argparse
 import numpy as np
 import matplotlib.pyplot as plt
-import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pacsv
 
-def generate_interference_pattern(length1, length2, wavelength=633e-9):
+def generate_interference_pattern(length1, length2, wavelength=633e-9, plot=False):
     """
     Generate and plot the interference pattern for a Michelson interferometer and export the data to a CSV file.
 
@@ -10,36 +12,46 @@ def generate_interference_pattern(length1, length2, wavelength=633e-9):
     - length1: Length of the first path in meters
     - length2: Length of the second path in meters
     - wavelength: Wavelength of the light source in meters (default is 500 nm)
+    - plot: Whether to display the interference pattern before exporting it (default is False)
     - output_csv: Filename for the output CSV file (default is 'interference_pattern.csv')
     """
     # Calculate the path difference
     path_difference = length1 - length2
 
-    # Define a range of path differences around the calculated path difference
-    path_diff_range = np.linspace(path_difference - 2e-6, path_difference + 2e-6, 1000)
+    # Define a range of path differences around the calculated path difference (single precision is
+    # ample for synthetic data compared with the 0.5% measurement errors)
+    path_diff_range = np.linspace(path_difference - 2e-6, path_difference + 2e-6, 1000, dtype=np.float32)
 
-    # Calculate the interference pattern
+    # Calculate the interference pattern, computing each step in place in one float32 array
     I0 = 1  # Maximum intensity
-    intensity = I0 * (1 + np.cos(2 * np.pi * path_diff_range / wavelength))
+    intensity = np.multiply(path_diff_range, np.float32(2 * np.pi / wavelength))
+    np.cos(intensity, out=intensity)
+    intensity += 1
+    intensity *= I0
 
-    # Plot the interference pattern
-    plt.figure(figsize=(10, 6))
-    plt.plot(path_diff_range * 1e6, intensity)  # Convert path difference to micrometers for plotting
-    plt.title('Interference Pattern of a Michelson Interferometer')
-    plt.xlabel('Path Difference (micrometers)')
-    plt.ylabel('Intensity')
-    plt.grid(True)
-    plt.show()
+    # Plot the interference pattern (only on request, so batch runs go straight to the CSV export)
+    if plot:
+        plt.figure(figsize=(10, 6))
+        plt.plot(path_diff_range * 1e6, intensity)  # Convert path difference to micrometers for plotting
+        plt.title('Interference Pattern of a Michelson Interferometer')
+        plt.xlabel('Path Difference (micrometers)')
+        plt.ylabel('Intensity')
+        plt.grid(True)
+        plt.show()
 
     # Export the data to a CSV file
-    data = {
+    data = pa.table({
         'Path Difference (micrometers)': path_diff_range * 1e6,
         'Intensity': intensity
-    }
-    df = pd.DataFrame(data)
-    df.to_csv('./data/interference_pattern.csv', index=False)
-
-# Example usage
-length1 = 1.0  # Length of the first path in meters
-length2 = 1.000001  # Length of the second path in meters
-generate_interference_pattern(length1, length2)
\ No newline at end of file
+    })
+    pacsv.write_csv(data, './data/interference_pattern.csv', write_options=pacsv.WriteOptions(quoting_header='none'))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Generate the interference pattern of a Michelson interferometer.')
+    parser.add_argument('--plot', action='store_true', help='Display the interference pattern')
+    args = parser.parse_args()
+
+    # Example usage
+    length1 = 1.0  # Length of the first path in meters
+    length2 = 1.000001  # Length of the second path in meters
+    generate_interference_pattern(length1, length2, plot=args.plot)
@@ -14,11 +14,32 @@ def load_data(file_path, signal_column):
     - time: Time array
     - signal: Signal array
     """
-    data = pd.read_csv(file_path)
-    time = data['Path Difference (micrometers)'].values
+    # Only parse the two columns that are used, with their dtypes given up front
+    time_column = 'Path Difference (micrometers)'
+    data = pd.read_csv(file_path, usecols=[time_column, signal_column],
+                       dtype={time_column: 'float64', signal_column: 'float64'}, engine='c', memory_map=True)
+    time = data[time_column].values
     signal = data[signal_column].values
     return time, signal
 
+def combine_signal_with_noise(intensity, noise, inplace=True, out=None):
+    """
+    Add the noise to the interference pattern.
+
+    Parameters:
+    - intensity: Interference pattern intensity array
+    - noise: Noise array
+    - inplace: Whether to add the noise into the intensity array instead of allocating a new one
+      (ignored if the intensity array is read-only or out is given)
+    - out: Optional preallocated array to write the combined signal into (e.g. a buffer reused across calls)
+
+    Returns:
+    - combined_signal: Combined signal array
+    """
+    if out is None and inplace and intensity.flags.writeable:
+        out = intensity
+    return np.add(intensity, noise, out=out)
+
 def plot_data(time, combined_signal, output_path=None):
     """
     Plot the combined signal.
@@ -47,12 +68,15 @@ def plot_data(time, combined_signal, output_path=None):
 time_interference, interference_pattern = load_data('../data/interference_pattern.csv', 'Intensity')
 time_noise, noise = load_data('../data/noise.csv', 'Noise')
 
-# Ensure the time arrays are the same
-if not np.array_equal(time_interference, time_noise):
+# Ensure the time arrays are the same (both generators sample the same linspace, so matching shapes
+# and endpoints are enough and avoid comparing every element; empty arrays have no endpoints to compare)
+if (time_interference.shape != time_noise.shape
+        or (time_interference.size > 0
+            and (time_interference[0] != time_noise[0] or time_interference[-1] != time_noise[-1]))):
     raise ValueError("Time arrays from the two files do not match.")
 
 # Add the interference pattern and noise together
-combined_signal = interference_pattern + noise
+combined_signal = combine_signal_with_noise(interference_pattern, noise)
 
 # Plot the combined signal
 plot_data(time_interference, combined_signal, output_path='../data/combined_signal_plot.png')